@@ -202,6 +202,52 @@ def test_val():
     YOLO(MODEL).val(data="coco8.yaml", imgsz=32, save_hybrid=True)
 
 
+@pytest.mark.skipif(not IS_TMP_WRITEABLE, reason="directory is not writeable")
+def test_val_close_on_error():
+    """Test that a failing validation run still releases its resources through BaseValidator.close()."""
+    from types import SimpleNamespace
+
+    from ultralytics.models.yolo.segment import SegmentationValidator
+
+    class Model(torch.nn.Module):
+        names = {0: "person"}
+
+        def forward(self, x, augment=False):
+            return x
+
+        def loss(self, batch, preds):
+            return None, torch.zeros(1)
+
+    def update_metrics(preds, batch):
+        assert validator.save_executor is not None  # created in init_metrics() for save_txt
+        raise RuntimeError("update_metrics failed")
+
+    batch = {
+        "img": torch.zeros(1, 3, 32, 32, dtype=torch.uint8),
+        "batch_idx": torch.zeros(0),
+        "cls": torch.zeros(0, 1),
+        "bboxes": torch.zeros(0, 4),
+        "masks": torch.zeros(1, 8, 8),
+    }
+    validator = SegmentationValidator([batch], save_dir=TMP / "val_close", args=dict(save_txt=True, plots=False))
+    validator.postprocess = lambda preds: preds
+    validator.update_metrics = update_metrics
+    trainer = SimpleNamespace(
+        device=torch.device("cpu"),
+        data={"val": ""},
+        amp=False,
+        ema=SimpleNamespace(ema=None),
+        model=Model(),
+        loss_items=torch.zeros(1),
+        stopper=SimpleNamespace(possible_stop=False),
+        epoch=0,
+        epochs=1,
+    )
+    with pytest.raises(RuntimeError, match="update_metrics failed"):
+        validator(trainer=trainer)
+    assert validator.save_executor is None
+
+
 def test_train_scratch():
     """Test training the YOLO model from scratch using the provided configuration."""
     model = YOLO(CFG)
@@ -438,6 +484,47 @@ def test_utils_ops():
     torch.allclose(boxes, xyxyxyxy2xywhr(xywhr2xyxyxyxy(boxes)), rtol=1e-3)
 
 
+def test_utils_metrics_batched_iou():
+    """Test that batched box, mask and rotated box IoU match per-image results, and binary masks match float masks."""
+    from ultralytics.utils.metrics import batch_probiou, box_iou, mask_iou
+
+    boxes1, boxes2 = torch.rand(3, 4, 4) * 10, torch.rand(3, 6, 4) * 10  # xyxy
+    boxes1[..., 2:] += boxes1[..., :2]
+    boxes2[..., 2:] += boxes2[..., :2]
+    assert torch.allclose(box_iou(boxes1, boxes2), torch.stack([box_iou(a, b) for a, b in zip(boxes1, boxes2)]))
+
+    boxes1, boxes2 = torch.rand(3, 4, 5) * 10, torch.rand(3, 6, 5) * 10  # xywhr
+    iou = torch.stack([batch_probiou(a, b) for a, b in zip(boxes1, boxes2)])
+    assert torch.allclose(batch_probiou(boxes1, boxes2), iou)
+
+    masks1, masks2 = torch.rand(3, 4, 64) > 0.5, torch.rand(3, 6, 64) > 0.5
+    assert torch.equal(mask_iou(masks1, masks2), torch.stack([mask_iou(a, b) for a, b in zip(masks1, masks2)]))
+    assert torch.equal(mask_iou(masks1[0], masks2[0].to(torch.uint8)), mask_iou(masks1[0].float(), masks2[0].float()))
+
+
+def test_utils_metrics_confusion_matrix():
+    """Test ConfusionMatrix.process_batch against a hand-counted detection case, including repeated cells."""
+    from ultralytics.utils.metrics import ConfusionMatrix
+
+    cm = ConfusionMatrix(nc=2, conf=0.25, iou_thres=0.45)
+    gt_bboxes = torch.tensor([[0, 0, 10, 10], [20, 20, 30, 30], [40, 40, 50, 50], [60, 60, 70, 70]]).float()
+    gt_cls = torch.tensor([0, 1, 1, 1])
+    detections = torch.tensor(
+        [
+            [0, 0, 10, 10, 0.9, 0],  # matches label 0 with the right class
+            [20, 20, 30, 30, 0.8, 0],  # matches label 1 with the wrong class
+            [1, 1, 11, 11, 0.5, 0],  # overlaps label 0, which is already matched: background
+            [80, 80, 90, 90, 0.7, 1],  # background
+            [100, 100, 110, 110, 0.6, 1],  # background, same cell as the previous detection
+            [40, 40, 50, 50, 0.1, 1],  # below the confidence threshold, so label 2 is missed
+        ]
+    )
+    cm.process_batch(detections, gt_bboxes, gt_cls)
+    cm.process_batch(None, gt_bboxes[:2], gt_cls[:2])  # image without detections
+    # rows are predicted classes, columns are true classes, the last row and column are background
+    assert np.array_equal(cm.matrix, np.array([[1, 1, 1], [0, 0, 2], [1, 3, 0]]))
+
+
 def test_utils_files():
     """Test file handling utilities including file age, date, and paths with spaces."""
     from ultralytics.utils.files import file_age, file_date, get_latest_run, spaces_in_path
@@ -206,6 +206,7 @@ CFG_BOOL_KEYS = {  # boolean-only arguments
     "save_hybrid",
     "half",
     "dnn",
+    "compile_metrics",
     "plots",
     "show",
     "save_txt",
@@ -166,38 +166,41 @@ class BaseValidator:
             Profile(device=self.device),
         )
         bar = TQDM(self.dataloader, desc=self.get_desc(), total=len(self.dataloader))
-        self.init_metrics(de_parallel(model))
-        self.jdict = []  # empty before each val
-        for batch_i, batch in enumerate(bar):
-            self.run_callbacks("on_val_batch_start")
-            self.batch_i = batch_i
-            # Preprocess
-            with dt[0]:
-                batch = self.preprocess(batch)
-
-            # Inference
-            with dt[1]:
-                preds = model(batch["img"], augment=augment)
-
-            # Loss
-            with dt[2]:
-                if self.training:
-                    self.loss += model.loss(batch, preds)[1]
-
-            # Postprocess
-            with dt[3]:
-                preds = self.postprocess(preds)
-
-            self.update_metrics(preds, batch)
-            if self.args.plots and batch_i < 3:
-                self.plot_val_samples(batch, batch_i)
-                self.plot_predictions(batch, preds, batch_i)
-
-            self.run_callbacks("on_val_batch_end")
-        stats = self.get_stats()
-        self.check_stats(stats)
-        self.speed = dict(zip(self.speed.keys(), (x.t / len(self.dataloader.dataset) * 1e3 for x in dt)))
-        self.finalize_metrics()
+        try:
+            self.init_metrics(de_parallel(model))
+            self.jdict = []  # empty before each val
+            for batch_i, batch in enumerate(bar):
+                self.run_callbacks("on_val_batch_start")
+                self.batch_i = batch_i
+                # Preprocess
+                with dt[0]:
+                    batch = self.preprocess(batch)
+
+                # Inference
+                with dt[1]:
+                    preds = model(batch["img"], augment=augment)
+
+                # Loss
+                with dt[2]:
+                    if self.training:
+                        self.loss += model.loss(batch, preds)[1]
+
+                # Postprocess
+                with dt[3]:
+                    preds = self.postprocess(preds)
+
+                self.update_metrics(preds, batch)
+                if self.args.plots and batch_i < 3:
+                    self.plot_val_samples(batch, batch_i)
+                    self.plot_predictions(batch, preds, batch_i)
+
+                self.run_callbacks("on_val_batch_end")
+            stats = self.get_stats()
+            self.check_stats(stats)
+            self.speed = dict(zip(self.speed.keys(), (x.t / len(self.dataloader.dataset) * 1e3 for x in dt)))
+            self.finalize_metrics()
+        finally:
+            self.close()  # release per-run resources, also if validation fails or is interrupted
         self.print_results()
         self.run_callbacks("on_val_end")
         if self.training:
@@ -298,6 +301,10 @@ class BaseValidator:
         """Finalizes and returns all metrics."""
         pass
 
+    def close(self):
+        """Releases resources created for a validation run, called at the end of `__call__` even on failure."""
+        pass
+
     def get_stats(self):
         """Returns statistics about the model's performance."""
         return {}
@@ -5,13 +5,15 @@ from pathlib import Path
 
 import numpy as np
 import torch
+from torch.nn.utils.rnn import pad_sequence
 
 from ultralytics.data import build_dataloader, build_yolo_dataset, converter
 from ultralytics.engine.validator import BaseValidator
-from ultralytics.utils import LOGGER, ops
+from ultralytics.utils import LOGGER, WINDOWS, ops
 from ultralytics.utils.checks import check_requirements
 from ultralytics.utils.metrics import ConfusionMatrix, DetMetrics, box_iou
 from ultralytics.utils.plotting import output_to_target, plot_images
+from ultralytics.utils.torch_utils import TORCH_2_0
 
 
 class DetectionValidator(BaseValidator):
@@ -41,6 +43,9 @@ class DetectionValidator(BaseValidator):
         self.iouv = torch.linspace(0.5, 0.95, 10)  # IoU vector for mAP@0.5:0.95
         self.niou = self.iouv.numel()
         self.lb = []  # for autolabelling
+        self.imgsz_scales = {}  # cached (w, h, w, h) target box scales per batch image size
+        self.tp_zeros = None  # cached all-False correct matrix, sliced per image
+        self.max_padded_pairs = 2**21  # upper bound on padded (B, M_max, N_max) IoU elements per batched IoU call
         if self.args.save_hybrid:
             LOGGER.warning(
                 "WARNING ⚠️ 'save_hybrid=True' will append ground truth to predictions for autolabelling.\n"
@@ -83,6 +88,8 @@ class DetectionValidator(BaseValidator):
         self.confusion_matrix = ConfusionMatrix(nc=self.nc, conf=self.args.conf)
         self.seen = 0
         self.jdict = []
+        self.imgsz_scales = {}
+        self.tp_zeros = torch.zeros(self.args.max_det, self.niou, dtype=torch.bool, device=self.device)
         self.stats = dict(tp=[], conf=[], pred_cls=[], target_cls=[], target_img=[])
 
     def get_desc(self):
@@ -101,6 +108,49 @@ class DetectionValidator(BaseValidator):
             max_det=self.args.max_det,
         )
 
+    def _can_compile(self):
+        """Returns True if torch.compile can generate triton kernels for the validation device."""
+        if not TORCH_2_0 or self.device.type != "cuda" or WINDOWS:
+            return False
+        try:
+            from torch.utils._triton import has_triton
+        except ImportError:  # torch<2.1
+            return False
+        # triton is missing from some wheels (e.g. Jetson) and does not support GPUs below compute capability 7.0
+        return has_triton() and torch.cuda.get_device_capability(self.device) >= (7, 0)
+
+    def _maybe_compile(self, fn):
+        """Returns `fn` wrapped with torch.compile if `compile_metrics=True` and inductor is available, else `fn`."""
+        if not (self.args.compile_metrics and self._can_compile()):
+            return fn
+        compiled = torch.compile(fn, dynamic=True)
+
+        def wrapper(*args, **kwargs):
+            """Calls the compiled `fn`, permanently falling back to eager mode if compilation or execution fails."""
+            nonlocal compiled
+            if compiled is not None:
+                try:
+                    return compiled(*args, **kwargs)
+                except Exception as e:
+                    LOGGER.warning(f"WARNING ⚠️ torch.compile of {fn.__name__}() failed, using eager mode: {e}")
+                    compiled = None
+            return fn(*args, **kwargs)
+
+        return wrapper
+
+    def _imgsz_scale(self, imgsz):
+        """Returns the (w, h, w, h) tensor that scales normalized target boxes to `imgsz`, created once per size."""
+        key = tuple(imgsz)
+        if key not in self.imgsz_scales:
+            self.imgsz_scales[key] = torch.tensor(imgsz, device=self.device)[[1, 0, 1, 0]]
+        return self.imgsz_scales[key]
+
+    def _zeros_tp(self, n):
+        """Returns an all-False (n, niou) correct matrix as a view of a cached tensor, so it must not be modified."""
+        if len(self.tp_zeros) < n:
+            self.tp_zeros = torch.zeros(n, self.niou, dtype=torch.bool, device=self.device)
+        return self.tp_zeros[:n]
+
     def _prepare_batch(self, si, batch):
         """Prepares a batch of images and annotations for validation."""
         idx = batch["batch_idx"] == si
@@ -110,7 +160,7 @@ class DetectionValidator(BaseValidator):
         imgsz = batch["img"].shape[2:]
         ratio_pad = batch["ratio_pad"][si]
         if len(cls):
-            bbox = ops.xywh2xyxy(bbox) * torch.tensor(imgsz, device=self.device)[[1, 0, 1, 0]]  # target boxes
+            bbox = ops.xywh2xyxy(bbox) * self._imgsz_scale(imgsz)  # target boxes
             ops.scale_boxes(imgsz, bbox, ori_shape, ratio_pad=ratio_pad)  # native-space labels
         return {"cls": cls, "bbox": bbox, "ori_shape": ori_shape, "imgsz": imgsz, "ratio_pad": ratio_pad}
 
@@ -124,14 +174,11 @@ class DetectionValidator(BaseValidator):
 
     def update_metrics(self, preds, batch):
         """Metrics."""
+        stats, evaluate = [], []  # evaluate holds (stat, predn, bbox, cls) of images matched in one batched call
         for si, pred in enumerate(preds):
             self.seen += 1
             npr = len(pred)
-            stat = dict(
-                conf=torch.zeros(0, device=self.device),
-                pred_cls=torch.zeros(0, device=self.device),
-                tp=torch.zeros(npr, self.niou, dtype=torch.bool, device=self.device),
-            )
+            stat = dict(tp=self._zeros_tp(npr))
             pbatch = self._prepare_batch(si, batch)
             cls, bbox = pbatch.pop("cls"), pbatch.pop("bbox")
             nl = len(cls)
@@ -139,8 +186,8 @@ class DetectionValidator(BaseValidator):
             stat["target_img"] = cls.unique()
             if npr == 0:
                 if nl:
-                    for k in self.stats.keys():
-                        self.stats[k].append(stat[k])
+                    stat["conf"] = stat["pred_cls"] = torch.zeros(0, device=self.device)
+                    stats.append(stat)
                     if self.args.plots:
                         self.confusion_matrix.process_batch(detections=None, gt_bboxes=bbox, gt_cls=cls)
                 continue
@@ -154,11 +201,10 @@ class DetectionValidator(BaseValidator):
 
             # Evaluate
             if nl:
-                stat["tp"] = self._process_batch(predn, bbox, cls)
+                evaluate.append((stat, predn, bbox, cls))
             if self.args.plots:
                 self.confusion_matrix.process_batch(predn, bbox, cls)
-            for k in self.stats.keys():
-                self.stats[k].append(stat[k])
+            stats.append(stat)
 
             # Save
             if self.args.save_json:
@@ -171,6 +217,14 @@ class DetectionValidator(BaseValidator):
                     self.save_dir / "labels" / f'{Path(batch["im_file"][si]).stem}.txt',
                 )
 
+        if evaluate:
+            matched_stats, *inputs = zip(*evaluate)
+            for stat, tp in zip(matched_stats, self._process_batches(*inputs)):
+                stat["tp"] = tp
+        for stat in stats:
+            for k in self.stats.keys():
+                self.stats[k].append(stat[k])
+
     def finalize_metrics(self, *args, **kwargs):
         """Set final values for metrics speed and confusion matrix."""
         self.metrics.speed = self.speed
@@ -227,6 +281,44 @@ class DetectionValidator(BaseValidator):
         iou = box_iou(gt_bboxes, detections[:, :4])
         return self.match_predictions(detections[:, 5], gt_cls, iou)
 
+    def _process_batches(self, detections, gt_bboxes, gt_cls):
+        """
+        Return the correct prediction matrices of all images in a batch, computed with padded batched IoU calls.
+
+        Images are grouped greedily so that each padded (B, M_max, N_max) IoU tensor stays below `max_padded_pairs`
+        elements, bounding memory for batches with a few very crowded images. A single image above the limit forms its
+        own group, matching the memory use of `_process_batch`. Subclasses change the IoU in `_process_padded`.
+
+        Args:
+            detections (Sequence[torch.Tensor]): Per-image detections, each as in `_process_batch`.
+            gt_bboxes (Sequence[torch.Tensor]): Per-image ground-truth bounding boxes.
+            gt_cls (Sequence[torch.Tensor]): Per-image target class indices.
+
+        Returns:
+            (List[torch.Tensor]): Correct prediction matrices of shape (N_i, 10), one per image.
+        """
+        results, start, m_max, n_max = [], 0, 0, 0
+        for i, (n, m) in enumerate(zip(map(len, detections), map(len, gt_cls))):
+            m_max, n_max = max(m_max, m), max(n_max, n)
+            if i > start and (i + 1 - start) * m_max * n_max > self.max_padded_pairs:
+                results += self._process_padded(detections[start:i], gt_bboxes[start:i], gt_cls[start:i])
+                start, m_max, n_max = i, m, n
+        return results + self._process_padded(detections[start:], gt_bboxes[start:], gt_cls[start:])
+
+    def _process_padded(self, detections, gt_bboxes, gt_cls):
+        """Compute the correct prediction matrices of a group of images with a single padded `box_iou` call."""
+        d = pad_sequence(detections, batch_first=True)  # (B, N, 6), zero padded
+        iou = box_iou(pad_sequence(gt_bboxes, batch_first=True), d[..., :4])
+        return self._match_padded(detections, gt_cls, d[..., 5], iou)
+
+    def _match_padded(self, detections, gt_cls, pred_cls, iou):
+        """Match each image of a padded (B, M, N) IoU tensor, with one device to host copy for the whole group."""
+        iou, pred_cls, true_cls = iou.cpu(), pred_cls.cpu(), pad_sequence(gt_cls, batch_first=True).cpu()
+        return [  # padded rows and columns are sliced off
+            self.match_predictions(pred_cls[i, :n], true_cls[i, :m], iou[i, :m, :n]).to(self.device)
+            for i, (n, m) in enumerate(zip(map(len, detections), map(len, gt_cls)))
+        ]
+
     def build_dataset(self, img_path, mode="val", batch=None):
         """
         Build YOLO Dataset.
@@ -3,6 +3,7 @@
 from pathlib import Path
 
 import torch
+from torch.nn.utils.rnn import pad_sequence
 
 from ultralytics.models.yolo.detect import DetectionValidator
 from ultralytics.utils import LOGGER, ops
@@ -28,6 +29,7 @@ class OBBValidator(DetectionValidator):
         """Initialize OBBValidator and set task to 'obb', metrics to OBBMetrics."""
         super().__init__(dataloader, save_dir, pbar, args, _callbacks)
         self.args.task = "obb"
+        self.probiou = batch_probiou
         self.metrics = OBBMetrics(save_dir=self.save_dir, plot=True, on_plot=self.on_plot)
 
     def init_metrics(self, model):
@@ -35,6 +37,7 @@ class OBBValidator(DetectionValidator):
         super().init_metrics(model)
         val = self.data.get(self.args.split, "")  # validation path
         self.is_dota = isinstance(val, str) and "DOTA" in val  # is COCO
+        self.probiou = self._maybe_compile(batch_probiou)  # fuse the elementwise probiou ops
 
     def postprocess(self, preds):
         """Apply Non-maximum suppression to prediction outputs."""
@@ -79,6 +82,12 @@ class OBBValidator(DetectionValidator):
         iou = batch_probiou(gt_bboxes, torch.cat([detections[:, :4], detections[:, -1:]], dim=-1))
         return self.match_predictions(detections[:, 5], gt_cls, iou)
 
+    def _process_padded(self, detections, gt_bboxes, gt_cls):
+        """Compute the correct prediction matrices of a group of images with a single padded `batch_probiou` call."""
+        d = pad_sequence(detections, batch_first=True)  # (B, N, 7), zero padded
+        iou = self.probiou(pad_sequence(gt_bboxes, batch_first=True), torch.cat([d[..., :4], d[..., -1:]], dim=-1))
+        return self._match_padded(detections, gt_cls, d[..., 5], iou)
+
     def _prepare_batch(self, si, batch):
         """Prepares and returns a batch for OBB validation."""
         idx = batch["batch_idx"] == si
@@ -88,7 +97,7 @@ class OBBValidator(DetectionValidator):
         imgsz = batch["img"].shape[2:]
         ratio_pad = batch["ratio_pad"][si]
         if len(cls):
-            bbox[..., :4].mul_(torch.tensor(imgsz, device=self.device)[[1, 0, 1, 0]])  # target boxes
+            bbox[..., :4].mul_(self._imgsz_scale(imgsz))  # target boxes
             ops.scale_boxes(imgsz, bbox, ori_shape, ratio_pad=ratio_pad, xywh=True)  # native-space labels
         return {"cls": cls, "bbox": bbox, "ori_shape": ori_shape, "imgsz": imgsz, "ratio_pad": ratio_pad}
 
@@ -115,15 +124,15 @@ class OBBValidator(DetectionValidator):
         """Serialize YOLO predictions to COCO json format."""
         stem = Path(filename).stem
         image_id = int(stem) if stem.isnumeric() else stem
-        rbox = torch.cat([predn[:, :4], predn[:, -1:]], dim=-1)
-        poly = ops.xywhr2xyxyxyxy(rbox).view(-1, 8)
-        for i, (r, b) in enumerate(zip(rbox.tolist(), poly.tolist())):
+        obb = predn[:, [0, 1, 2, 3, 6, 4, 5]]  # xywh, r, conf, cls
+        poly = ops.xywhr2xyxyxyxy(obb[:, :5]).view(-1, 8)
+        for o, b in zip(obb.tolist(), poly.tolist()):
             self.jdict.append(
                 {
                     "image_id": image_id,
-                    "category_id": self.class_map[int(predn[i, 5].item())],
-                    "score": round(predn[i, 4].item(), 5),
-                    "rbox": [round(x, 3) for x in r],
+                    "category_id": self.class_map[int(o[6])],
+                    "score": round(o[5], 5),
+                    "rbox": [round(x, 3) for x in o[:5]],
                     "poly": [round(x, 3) for x in b],
                 }
             )
@@ -134,9 +143,7 @@ class OBBValidator(DetectionValidator):
 
         from ultralytics.engine.results import Results
 
-        rboxes = torch.cat([predn[:, :4], predn[:, -1:]], dim=-1)
-        # xywh, r, conf, cls
-        obb = torch.cat([rboxes, predn[:, 4:6]], dim=-1)
+        obb = predn[:, [0, 1, 2, 3, 6, 4, 5]]  # xywh, r, conf, cls
         Results(
             np.zeros((shape[0], shape[1]), dtype=np.uint8),
             path=None,
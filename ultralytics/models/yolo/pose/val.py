@@ -109,10 +109,8 @@ class PoseValidator(DetectionValidator):
             self.seen += 1
             npr = len(pred)
             stat = dict(
-                conf=torch.zeros(0, device=self.device),
-                pred_cls=torch.zeros(0, device=self.device),
-                tp=torch.zeros(npr, self.niou, dtype=torch.bool, device=self.device),
-                tp_p=torch.zeros(npr, self.niou, dtype=torch.bool, device=self.device),
+                tp=self._zeros_tp(npr),
+                tp_p=self._zeros_tp(npr),
             )
             pbatch = self._prepare_batch(si, batch)
             cls, bbox = pbatch.pop("cls"), pbatch.pop("bbox")
@@ -121,6 +119,7 @@ class PoseValidator(DetectionValidator):
             stat["target_img"] = cls.unique()
             if npr == 0:
                 if nl:
+                    stat["conf"] = stat["pred_cls"] = torch.zeros(0, device=self.device)
                     for k in self.stats.keys():
                         self.stats[k].append(stat[k])
                     if self.args.plots:
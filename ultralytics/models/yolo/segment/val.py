@@ -1,19 +1,44 @@
 # Ultralytics YOLO 🚀, AGPL-3.0 license
 
-from multiprocessing.pool import ThreadPool
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
 import numpy as np
 import torch
 import torch.nn.functional as F
+from torch.nn.utils.rnn import pad_sequence
 
 from ultralytics.models.yolo.detect import DetectionValidator
-from ultralytics.utils import LOGGER, NUM_THREADS, ops
+from ultralytics.utils import LOGGER, ops
 from ultralytics.utils.checks import check_requirements
 from ultralytics.utils.metrics import SegmentMetrics, box_iou, mask_iou
 from ultralytics.utils.plotting import output_to_target, plot_images
 
 
+def remap_gt_masks(gt_masks, index, shape):
+    """
+    Expand ground truth masks to one binary mask per instance and resize them to the predicted mask shape.
+
+    Resizing uses nearest neighbour sampling, consistent with the ground truth mask resize in `v8SegmentationLoss`.
+
+    Args:
+        gt_masks (torch.Tensor): Ground truth masks of shape (M, H, W), or (1, H, W) of instance ids if `index` is set.
+            A leading batch dimension, e.g. (B, M, H, W), is also supported.
+        index (torch.Tensor | None): Instance ids of shape (M, 1, 1) used to split overlapping masks, or None.
+        shape (torch.Size): Target (h, w) shape of the predicted masks.
+
+    Returns:
+        (torch.Tensor): Binary masks of shape (M, h, w), or (B, M, h, w), bool if split or resized.
+    """
+    if index is not None:
+        gt_masks = gt_masks == index  # broadcast shape(1,640,640) -> (n,640,640)
+    if gt_masks.shape[-2:] != shape:  # masks are binary here, so nearest matches bilinear + threshold at a lower cost
+        resized = F.interpolate(gt_masks.flatten(0, -3)[None].float(), shape, mode="nearest")[0]
+        gt_masks = resized.view(*gt_masks.shape[:-2], *shape) > 0.5  # bool, 1 byte per element
+    return gt_masks
+
+
 class SegmentationValidator(DetectionValidator):
     """
     A class extending the DetectionValidator class for validation based on a segmentation model.
@@ -32,7 +57,14 @@ class SegmentationValidator(DetectionValidator):
         """Initialize SegmentationValidator and set task to 'segment', metrics to SegmentMetrics."""
         super().__init__(dataloader, save_dir, pbar, args, _callbacks)
         self.plot_masks = None
+        self.plot_masks_n = 0
         self.process = None
+        self.save_executor = None
+        self.save_futures = deque()
+        self.remap_gt_masks = remap_gt_masks
+        self.mask_iou = mask_iou
+        self.mask_index = None  # cached overlap mask instance ids (n, 1, 1), sliced per image
+        self.max_padded_pixels = 2**26  # upper bound on padded (B, N_max + M_max, h, w) mask elements per IoU call
         self.args.task = "segment"
         self.metrics = SegmentMetrics(save_dir=self.save_dir, on_plot=self.on_plot)
 
@@ -45,11 +77,18 @@ class SegmentationValidator(DetectionValidator):
     def init_metrics(self, model):
         """Initialize metrics and select mask processing function based on save_json flag."""
         super().init_metrics(model)
-        self.plot_masks = []
+        self.plot_masks = None  # uint8 (batch * 15, h, w) buffer of the current plotted batch
+        self.plot_masks_n = 0  # number of filled rows in plot_masks
+        self.mask_index = torch.arange(1, 256, device=self.device).view(-1, 1, 1)
         if self.args.save_json:
             check_requirements("pycocotools>=2.0.6")
         # more accurate vs faster
         self.process = ops.process_mask_native if self.args.save_json or self.args.save_txt else ops.process_mask
+        if self.args.save_json or self.args.save_txt:  # host-side saving overlaps the device work of the next images
+            self.save_executor = ThreadPoolExecutor(max_workers=1)
+        # fuse the masks remapping and IoU elementwise ops into as few kernels as possible
+        self.remap_gt_masks = self._maybe_compile(remap_gt_masks)
+        self.mask_iou = self._maybe_compile(mask_iou)
         self.stats = dict(tp_m=[], tp=[], conf=[], pred_cls=[], target_cls=[], target_img=[])
 
     def get_desc(self):
@@ -93,19 +132,19 @@ class SegmentationValidator(DetectionValidator):
     def _prepare_pred(self, pred, pbatch, proto):
         """Prepares a batch for training or inference by processing images and targets."""
         predn = super()._prepare_pred(pred, pbatch)
-        pred_masks = self.process(proto, pred[:, 6:], pred[:, :4], shape=pbatch["imgsz"])
+        pred_masks = self.process(proto, pred[:, 6:], pred[:, :4], shape=pbatch["imgsz"]).to(torch.uint8)  # binary
         return predn, pred_masks
 
     def update_metrics(self, preds, batch):
         """Metrics."""
+        stats, evaluate = [], []  # evaluate holds (stat, predn, bbox, cls, pred_masks, gt_masks) of images to match
+        n_max = m_max = 0  # largest number of predictions and labels of the images in evaluate
         for si, (pred, proto) in enumerate(zip(preds[0], preds[1])):
             self.seen += 1
             npr = len(pred)
             stat = dict(
-                conf=torch.zeros(0, device=self.device),
-                pred_cls=torch.zeros(0, device=self.device),
-                tp=torch.zeros(npr, self.niou, dtype=torch.bool, device=self.device),
-                tp_m=torch.zeros(npr, self.niou, dtype=torch.bool, device=self.device),
+                tp=self._zeros_tp(npr),
+                tp_m=self._zeros_tp(npr),
             )
             pbatch = self._prepare_batch(si, batch)
             cls, bbox = pbatch.pop("cls"), pbatch.pop("bbox")
@@ -114,8 +153,8 @@ class SegmentationValidator(DetectionValidator):
             stat["target_img"] = cls.unique()
             if npr == 0:
                 if nl:
-                    for k in self.stats.keys():
-                        self.stats[k].append(stat[k])
+                    stat["conf"] = stat["pred_cls"] = torch.zeros(0, device=self.device)
+                    stats.append(stat)
                     if self.args.plots:
                         self.confusion_matrix.process_batch(detections=None, gt_bboxes=bbox, gt_cls=cls)
                 continue
@@ -131,44 +170,81 @@ class SegmentationValidator(DetectionValidator):
 
             # Evaluate
             if nl:
-                stat["tp"] = self._process_batch(predn, bbox, cls)
-                stat["tp_m"] = self._process_batch(
-                    predn, bbox, cls, pred_masks, gt_masks, self.args.overlap_mask, masks=True
-                )
+                n_max, m_max = max(n_max, npr), max(m_max, nl)
+                if evaluate and (len(evaluate) + 1) * (n_max + m_max) * pred_masks[0].numel() > self.max_padded_pixels:
+                    self._evaluate(evaluate)  # match the held images first, bounding the padded size and held masks
+                    evaluate, n_max, m_max = [], npr, nl
+                evaluate.append((stat, predn, bbox, cls, pred_masks, gt_masks))
             if self.args.plots:
                 self.confusion_matrix.process_batch(predn, bbox, cls)
+            stats.append(stat)
 
+            if self.args.plots and self.batch_i < 3:
+                masks = pred_masks[:15]  # filter top 15 to plot
+                if self.plot_masks is None:  # pinned for async copies from CUDA, synchronized in plot_predictions()
+                    shape = (len(preds[0]) * 15, *masks.shape[1:])
+                    self.plot_masks = torch.empty(shape, dtype=torch.uint8, pin_memory=masks.is_cuda)
+                n = self.plot_masks_n
+                self.plot_masks[n : n + len(masks)].copy_(masks, non_blocking=masks.is_cuda)  # MPS stays blocking
+                self.plot_masks_n += len(masks)
+
+            # Save
+            if self.save_executor is not None:
+                if len(self.save_futures) >= 4:  # bound the device memory held by queued masks
+                    self.save_futures.popleft().result()
+                args = predn, pred_masks, pbatch["ori_shape"], batch["im_file"][si], batch["ratio_pad"][si]
+                self.save_futures.append(self.save_executor.submit(self._save_pred, *args))
+
+        if evaluate:
+            self._evaluate(evaluate)
+        for stat in stats:
             for k in self.stats.keys():
                 self.stats[k].append(stat[k])
 
-            pred_masks = torch.as_tensor(pred_masks, dtype=torch.uint8)
-            if self.args.plots and self.batch_i < 3:
-                self.plot_masks.append(pred_masks[:15].cpu())  # filter top 15 to plot
+    def _evaluate(self, evaluate):
+        """Sets the box and mask correct prediction matrices of a group of images with one padded IoU call each."""
+        stats, predn, bbox, cls, pred_masks, gt_masks = zip(*evaluate)
+        tp = self._process_batches(predn, bbox, cls)
+        tp_m = self._process_batches(predn, bbox, cls, pred_masks, gt_masks, self.args.overlap_mask, masks=True)
+        for stat, *x in zip(stats, tp, tp_m):
+            stat["tp"], stat["tp_m"] = x
 
-            # Save
-            if self.args.save_json:
-                self.pred_to_json(
-                    predn,
-                    batch["im_file"][si],
-                    ops.scale_image(
-                        pred_masks.permute(1, 2, 0).contiguous().cpu().numpy(),
-                        pbatch["ori_shape"],
-                        ratio_pad=batch["ratio_pad"][si],
-                    ),
-                )
-            if self.args.save_txt:
-                self.save_one_txt(
-                    predn,
-                    pred_masks,
-                    self.args.save_conf,
-                    pbatch["ori_shape"],
-                    self.save_dir / "labels" / f'{Path(batch["im_file"][si]).stem}.txt',
-                )
+    def _save_pred(self, predn, pred_masks, ori_shape, im_file, ratio_pad):
+        """Saves the predictions of one image to JSON and/or txt, run in the background by `save_executor`."""
+        if self.args.save_json:
+            self.pred_to_json(
+                predn,
+                im_file,
+                ops.scale_image(
+                    pred_masks.cpu().numpy().transpose(1, 2, 0),  # stride-only CHW->HWC view on host
+                    ori_shape,
+                    ratio_pad=ratio_pad,
+                ),
+            )
+        if self.args.save_txt:
+            self.save_one_txt(
+                predn,
+                pred_masks,
+                self.args.save_conf,
+                ori_shape,
+                self.save_dir / "labels" / f"{Path(im_file).stem}.txt",
+            )
 
     def finalize_metrics(self, *args, **kwargs):
         """Sets speed and confusion matrix for evaluation metrics."""
         self.metrics.speed = self.speed
         self.metrics.confusion_matrix = self.confusion_matrix
+        while self.save_futures:
+            self.save_futures.popleft().result()  # wait for all saves (not included in speed), re-raising any error
+
+    def close(self):
+        """Shuts down the save thread, also when validation fails or is interrupted."""
+        if self.save_executor is not None:
+            for f in self.save_futures:
+                f.cancel()  # drop queued saves left over from a failed run
+            self.save_futures.clear()
+            self.save_executor.shutdown()  # waits for a running save
+            self.save_executor = None
 
     def _process_batch(self, detections, gt_bboxes, gt_cls, pred_masks=None, gt_masks=None, overlap=False, masks=False):
         """
@@ -202,20 +278,53 @@ class SegmentationValidator(DetectionValidator):
             ```
         """
         if masks:
-            if overlap:
-                nl = len(gt_cls)
-                index = torch.arange(nl, device=gt_masks.device).view(nl, 1, 1) + 1
-                gt_masks = gt_masks.repeat(nl, 1, 1)  # shape(1,640,640) -> (n,640,640)
-                gt_masks = torch.where(gt_masks == index, 1.0, 0.0)
-            if gt_masks.shape[1:] != pred_masks.shape[1:]:
-                gt_masks = F.interpolate(gt_masks[None], pred_masks.shape[1:], mode="bilinear", align_corners=False)[0]
-                gt_masks = gt_masks.gt_(0.5)
-            iou = mask_iou(gt_masks.view(gt_masks.shape[0], -1), pred_masks.view(pred_masks.shape[0], -1))
+            index = self._mask_index(len(gt_cls), gt_masks.device) if overlap else None
+            gt_masks = self.remap_gt_masks(gt_masks, index, pred_masks.shape[1:])
+            iou = self.mask_iou(gt_masks.view(gt_masks.shape[0], -1), pred_masks.view(pred_masks.shape[0], -1))
         else:  # boxes
             iou = box_iou(gt_bboxes, detections[:, :4])
 
         return self.match_predictions(detections[:, 5], gt_cls, iou)
 
+    def _process_batches(
+        self, detections, gt_bboxes, gt_cls, pred_masks=None, gt_masks=None, overlap=False, masks=False
+    ):
+        """
+        Compute the correct prediction matrices of a group of images with padded `box_iou` or `mask_iou` calls.
+
+        The predicted masks of all images share the batch image size, so they are padded like the boxes and labels.
+        Boxes are matched by `DetectionValidator._process_batches`, masks with a single `mask_iou` call.
+
+        Args:
+            detections (Sequence[torch.Tensor]): Per-image detections of shape (N_i, 6), as in `_process_batch`.
+            gt_bboxes (Sequence[torch.Tensor]): Per-image ground truth boxes of shape (M_i, 4).
+            gt_cls (Sequence[torch.Tensor]): Per-image class labels of shape (M_i,).
+            pred_masks (Sequence[torch.Tensor] | None): Per-image predicted masks of shape (N_i, h, w).
+            gt_masks (Sequence[torch.Tensor] | None): Per-image ground truth masks of shape (M_i, H, W), or (1, H, W)
+                instance ids if `overlap` is set.
+            overlap (bool): Flag indicating if overlapping masks should be considered.
+            masks (bool): Flag indicating if the IoU is computed between masks instead of boxes.
+
+        Returns:
+            (List[torch.Tensor]): Correct prediction matrices of shape (N_i, 10), one per image.
+        """
+        if not masks:  # boxes
+            return super()._process_batches(detections, gt_bboxes, gt_cls)
+        pred_masks = pad_sequence(pred_masks, batch_first=True)  # (B, N, h, w), zero padded
+        if overlap:  # (B, 1, H, W) instance ids, padded ids are absent from their image and give empty masks
+            gt_masks, index = torch.stack(gt_masks), self._mask_index(max(map(len, gt_cls)), pred_masks.device)
+        else:  # (B, M, H, W), zero padded
+            gt_masks, index = pad_sequence(gt_masks, batch_first=True), None
+        gt_masks = self.remap_gt_masks(gt_masks, index, pred_masks.shape[2:])
+        iou = self.mask_iou(gt_masks.flatten(2), pred_masks.flatten(2))
+        return self._match_padded(detections, gt_cls, pad_sequence(detections, batch_first=True)[..., 5], iou)
+
+    def _mask_index(self, n, device):
+        """Returns overlap mask instance ids 1..n of shape (n, 1, 1), sliced from a cached range tensor."""
+        if self.mask_index is None or len(self.mask_index) < n:
+            self.mask_index = torch.arange(1, max(n, 255) + 1, device=device).view(-1, 1, 1)
+        return self.mask_index[:n]
+
     def plot_val_samples(self, batch, ni):
         """Plots validation samples with bounding box labels."""
         plot_images(
@@ -232,16 +341,18 @@ class SegmentationValidator(DetectionValidator):
 
     def plot_predictions(self, batch, preds, ni):
         """Plots batch predictions with masks and bounding boxes."""
+        if self.device.type == "cuda":
+            torch.cuda.current_stream(self.device).synchronize()  # wait for async plot_masks copies
         plot_images(
             batch["img"],
             *output_to_target(preds[0], max_det=15),  # not set to self.args.max_det due to slow plotting speed
-            torch.cat(self.plot_masks, dim=0) if len(self.plot_masks) else self.plot_masks,
+            self.plot_masks[: self.plot_masks_n] if self.plot_masks is not None else [],
             paths=batch["im_file"],
             fname=self.save_dir / f"val_batch{ni}_pred.jpg",
             names=self.names,
             on_plot=self.on_plot,
         )  # pred
-        self.plot_masks.clear()
+        self.plot_masks, self.plot_masks_n = None, 0  # new buffer per batch, plot_images() runs in a thread
 
     def save_one_txt(self, predn, pred_masks, save_conf, shape, file):
         """Save YOLO detections to a txt file in normalized coordinates in a specific format."""
@@ -264,19 +375,13 @@ class SegmentationValidator(DetectionValidator):
         """
         from pycocotools.mask import encode  # noqa
 
-        def single_encode(x):
-            """Encode predicted masks as RLE and append results to jdict."""
-            rle = encode(np.asarray(x[:, :, None], order="F", dtype="uint8"))[0]
-            rle["counts"] = rle["counts"].decode("utf-8")
-            return rle
-
         stem = Path(filename).stem
         image_id = int(stem) if stem.isnumeric() else stem
         box = ops.xyxy2xywh(predn[:, :4])  # xywh
         box[:, :2] -= box[:, 2:] / 2  # xy center to top-left corner
-        pred_masks = np.transpose(pred_masks, (2, 0, 1))
-        with ThreadPool(NUM_THREADS) as pool:
-            rles = pool.map(single_encode, pred_masks)
+        rles = encode(np.asfortranarray(pred_masks, dtype=np.uint8))  # one call for the whole (H, W, n) stack
+        for rle in rles:
+            rle["counts"] = rle["counts"].decode("utf-8")
         for i, (p, b) in enumerate(zip(predn.tolist(), box.tolist())):
             self.jdict.append(
                 {
@@ -55,20 +55,20 @@ def box_iou(box1, box2, eps=1e-7):
     Based on https://github.com/pytorch/vision/blob/master/torchvision/ops/boxes.py.
 
     Args:
-        box1 (torch.Tensor): A tensor of shape (N, 4) representing N bounding boxes.
-        box2 (torch.Tensor): A tensor of shape (M, 4) representing M bounding boxes.
+        box1 (torch.Tensor): A tensor of shape (N, 4) or (B, N, 4) representing N bounding boxes.
+        box2 (torch.Tensor): A tensor of shape (M, 4) or (B, M, 4) representing M bounding boxes.
         eps (float, optional): A small value to avoid division by zero. Defaults to 1e-7.
 
     Returns:
-        (torch.Tensor): An NxM tensor containing the pairwise IoU values for every element in box1 and box2.
+        (torch.Tensor): An NxM (or BxNxM) tensor containing the pairwise IoU values for every element in box1 and box2.
     """
     # NOTE: Need .float() to get accurate iou values
     # inter(N,M) = (rb(N,M,2) - lt(N,M,2)).clamp(0).prod(2)
-    (a1, a2), (b1, b2) = box1.float().unsqueeze(1).chunk(2, 2), box2.float().unsqueeze(0).chunk(2, 2)
-    inter = (torch.min(a2, b2) - torch.max(a1, b1)).clamp_(0).prod(2)
+    (a1, a2), (b1, b2) = box1.float().unsqueeze(-2).chunk(2, -1), box2.float().unsqueeze(-3).chunk(2, -1)
+    inter = (torch.min(a2, b2) - torch.max(a1, b1)).clamp_(0).prod(-1)
 
     # IoU = inter / (area1 + area2 - inter)
-    return inter / ((a2 - a1).prod(2) + (b2 - b1).prod(2) - inter + eps)
+    return inter / ((a2 - a1).prod(-1) + (b2 - b1).prod(-1) - inter + eps)
 
 
 def bbox_iou(box1, box2, xywh=True, GIoU=False, DIoU=False, CIoU=False, eps=1e-7):
@@ -142,9 +142,18 @@ def mask_iou(mask1, mask2, eps=1e-7):
 
     Returns:
         (torch.Tensor): A tensor of shape (N, M) representing masks IoU.
+
+    Note:
+        Binary masks may be passed as bool or uint8 tensors; they are only cast to float for the intersection matmul.
+        Inputs of shape (B, N, n) and (B, M, n) return the (B, N, M) IoU of each batch element.
     """
-    intersection = torch.matmul(mask1, mask2.T).clamp_(0)
-    union = (mask1.sum(1)[:, None] + mask2.sum(1)[None]) - intersection  # (area1 + area2) - intersection
+    area1, area2 = mask1.sum(-1), mask2.sum(-1)
+    if not mask1.is_floating_point():
+        mask1 = mask1.float()
+    if not mask2.is_floating_point():
+        mask2 = mask2.float()
+    intersection = torch.matmul(mask1, mask2.transpose(-1, -2)).clamp_(0)
+    union = (area1[..., :, None] + area2[..., None, :]) - intersection  # (area1 + area2) - intersection
     return intersection / (union + eps)
 
 
@@ -175,13 +184,13 @@ def _get_covariance_matrix(boxes):
     Generating covariance matrix from obbs.
 
     Args:
-        boxes (torch.Tensor): A tensor of shape (N, 5) representing rotated bounding boxes, with xywhr format.
+        boxes (torch.Tensor): A tensor of shape (..., N, 5) representing rotated bounding boxes, with xywhr format.
 
     Returns:
         (torch.Tensor): Covariance matrices corresponding to original rotated bounding boxes.
     """
     # Gaussian bounding boxes, ignore the center points (the first two columns) because they are not needed here.
-    gbbs = torch.cat((boxes[:, 2:4].pow(2) / 12, boxes[:, 4:]), dim=-1)
+    gbbs = torch.cat((boxes[..., 2:4].pow(2) / 12, boxes[..., 4:]), dim=-1)
     a, b, c = gbbs.split(1, dim=-1)
     cos = c.cos()
     sin = c.sin()
@@ -247,23 +256,24 @@ def batch_probiou(obb1, obb2, eps=1e-7):
 
     Returns:
         (torch.Tensor): A tensor of shape (N, M) representing obb similarities.
+
+    Note:
+        Inputs with matching leading batch dimensions, i.e. (B, N, 5) and (B, M, 5), return a (B, N, M) tensor.
     """
     obb1 = torch.from_numpy(obb1) if isinstance(obb1, np.ndarray) else obb1
     obb2 = torch.from_numpy(obb2) if isinstance(obb2, np.ndarray) else obb2
 
     x1, y1 = obb1[..., :2].split(1, dim=-1)
-    x2, y2 = (x.squeeze(-1)[None] for x in obb2[..., :2].split(1, dim=-1))
+    x2, y2 = (x.squeeze(-1).unsqueeze(-2) for x in obb2[..., :2].split(1, dim=-1))
     a1, b1, c1 = _get_covariance_matrix(obb1)
-    a2, b2, c2 = (x.squeeze(-1)[None] for x in _get_covariance_matrix(obb2))
+    a2, b2, c2 = (x.squeeze(-1).unsqueeze(-2) for x in _get_covariance_matrix(obb2))
 
-    t1 = (
-        ((a1 + a2) * (y1 - y2).pow(2) + (b1 + b2) * (x1 - x2).pow(2)) / ((a1 + a2) * (b1 + b2) - (c1 + c2).pow(2) + eps)
-    ) * 0.25
-    t2 = (((c1 + c2) * (x2 - x1) * (y1 - y2)) / ((a1 + a2) * (b1 + b2) - (c1 + c2).pow(2) + eps)) * 0.5
+    a, b, c = a1 + a2, b1 + b2, c1 + c2  # pairwise summed covariances, shared by all terms below
+    det = a * b - c.pow(2)
+    t1 = ((a * (y1 - y2).pow(2) + b * (x1 - x2).pow(2)) / (det + eps)) * 0.25
+    t2 = ((c * (x2 - x1) * (y1 - y2)) / (det + eps)) * 0.5
     t3 = (
-        ((a1 + a2) * (b1 + b2) - (c1 + c2).pow(2))
-        / (4 * ((a1 * b1 - c1.pow(2)).clamp_(0) * (a2 * b2 - c2.pow(2)).clamp_(0)).sqrt() + eps)
-        + eps
+        det / (4 * ((a1 * b1 - c1.pow(2)).clamp_(0) * (a2 * b2 - c2.pow(2)).clamp_(0)).sqrt() + eps) + eps
     ).log() * 0.5
     bd = (t1 + t2 + t3).clamp(eps, 100.0)
     hd = (1.0 - (-bd).exp() + eps).sqrt()
@@ -332,19 +342,17 @@ class ConfusionMatrix:
         if gt_cls.shape[0] == 0:  # Check if labels is empty
             if detections is not None:
                 detections = detections[detections[:, 4] > self.conf]
-                detection_classes = detections[:, 5].int()
-                for dc in detection_classes:
-                    self.matrix[dc, self.nc] += 1  # false positives
+                detection_classes = detections[:, 5].int().cpu().numpy()
+                np.add.at(self.matrix, (detection_classes, self.nc), 1)  # false positives
             return
         if detections is None:
-            gt_classes = gt_cls.int()
-            for gc in gt_classes:
-                self.matrix[self.nc, gc] += 1  # background FN
+            gt_classes = gt_cls.int().cpu().numpy()
+            np.add.at(self.matrix, (self.nc, gt_classes), 1)  # background FN
             return
 
         detections = detections[detections[:, 4] > self.conf]
-        gt_classes = gt_cls.int()
-        detection_classes = detections[:, 5].int()
+        gt_classes = gt_cls.int().cpu().numpy()
+        detection_classes = detections[:, 5].int().cpu().numpy()
         is_obb = detections.shape[1] == 7 and gt_bboxes.shape[1] == 5  # with additional `angle` dimension
         iou = (
             batch_probiou(gt_bboxes, torch.cat([detections[:, :4], detections[:, -1:]], dim=-1))
@@ -364,18 +372,16 @@ class ConfusionMatrix:
             matches = np.zeros((0, 3))
 
         n = matches.shape[0] > 0
-        m0, m1, _ = matches.transpose().astype(int)
-        for i, gc in enumerate(gt_classes):
-            j = m0 == i
-            if n and sum(j) == 1:
-                self.matrix[detection_classes[m1[j]], gc] += 1  # correct
-            else:
-                self.matrix[self.nc, gc] += 1  # true background
+        m0, m1, _ = matches.transpose().astype(int)  # unique label and detection indices of the matched pairs
+        matched = np.zeros(len(gt_classes), dtype=bool)
+        matched[m0] = True
+        np.add.at(self.matrix, (detection_classes[m1], gt_classes[m0]), 1)  # correct
+        np.add.at(self.matrix, (self.nc, gt_classes[~matched]), 1)  # true background
 
         if n:
-            for i, dc in enumerate(detection_classes):
-                if not any(m1 == i):
-                    self.matrix[dc, self.nc] += 1  # predicted background
+            unmatched = np.ones(len(detection_classes), dtype=bool)
+            unmatched[m1] = False
+            np.add.at(self.matrix, (detection_classes[unmatched], self.nc), 1)  # predicted background
 
     def matrix(self):
         """Returns the confusion matrix."""
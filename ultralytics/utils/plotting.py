@@ -1322,25 +1322,26 @@ def plot_tune_results(csv_file="tune_results.csv"):
     _save_one_file(csv_file.with_name("tune_fitness.png"))
 
 
+def _stack_output(output, max_det, ncols):
+    """Stack the first `max_det` rows and `ncols` columns of each image output into one CPU tensor with batch ids."""
+    output = [o[:max_det, :ncols] for o in output]
+    batch_idx = torch.arange(len(output)).repeat_interleave(torch.tensor([len(o) for o in output], dtype=torch.long))
+    return batch_idx[:, None], torch.cat(output, 0).cpu()  # single device to host copy for the whole batch
+
+
 def output_to_target(output, max_det=300):
     """Convert model output to target format [batch_id, class_id, x, y, w, h, conf] for plotting."""
-    targets = []
-    for i, o in enumerate(output):
-        box, conf, cls = o[:max_det, :6].cpu().split((4, 1, 1), 1)
-        j = torch.full((conf.shape[0], 1), i)
-        targets.append(torch.cat((j, cls, ops.xyxy2xywh(box), conf), 1))
-    targets = torch.cat(targets, 0).numpy()
+    j, o = _stack_output(output, max_det, 6)
+    box, conf, cls = o.split((4, 1, 1), 1)
+    targets = torch.cat((j, cls, ops.xyxy2xywh(box), conf), 1).numpy()
     return targets[:, 0], targets[:, 1], targets[:, 2:-1], targets[:, -1]
 
 
 def output_to_rotated_target(output, max_det=300):
     """Convert model output to target format [batch_id, class_id, x, y, w, h, conf] for plotting."""
-    targets = []
-    for i, o in enumerate(output):
-        box, conf, cls, angle = o[:max_det].cpu().split((4, 1, 1, 1), 1)
-        j = torch.full((conf.shape[0], 1), i)
-        targets.append(torch.cat((j, cls, box, angle, conf), 1))
-    targets = torch.cat(targets, 0).numpy()
+    j, o = _stack_output(output, max_det, 7)
+    box, conf, cls, angle = o.split((4, 1, 1, 1), 1)
+    targets = torch.cat((j, cls, box, angle, conf), 1).numpy()
     return targets[:, 0], targets[:, 1], targets[:, 2:-1], targets[:, -1]
 
 